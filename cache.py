@@ -0,0 +1,79 @@
+"""
+Response Cache
+
+Redis-backed cache for the read-heavy product endpoints, with a small
+process-local layer in front for repeat hits inside one worker.
+
+Product keys are stamped with a version counter ("products:ver") so that
+invalidation after a product mutation is a single INCR instead of a key
+scan. The cache is disabled transparently when REDIS_URL is not set.
+"""
+
+import os
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_client = None
+
+redis_url = os.getenv("REDIS_URL")
+if redis_url:
+    _client = redis.Redis.from_url(redis_url, decode_responses=True)
+
+CACHE_TTL = 300  # seconds
+
+_VERSION_KEY = "products:ver"
+_LOCAL_MAX = 256
+
+# Process-local layer: versioned key -> serialized response
+_local = {}
+
+
+async def _versioned(key: str) -> str:
+    ver = await _client.get(_VERSION_KEY) or "0"
+    return f"{key}:v{ver}"
+
+
+async def get_cached(key: str):
+    """Return the cached JSON string for key, or None on miss/unavailable."""
+    if _client is None:
+        return None
+    try:
+        full_key = await _versioned(key)
+        value = _local.get(full_key)
+        if value is None:
+            value = await _client.get(full_key)
+            if value is not None:
+                if len(_local) >= _LOCAL_MAX:
+                    _local.clear()
+                _local[full_key] = value
+        return value
+    except redis.RedisError:
+        return None
+
+
+async def set_cached(key: str, value: str):
+    """Store a serialized response under the current product version."""
+    if _client is None:
+        return
+    try:
+        full_key = await _versioned(key)
+        await _client.setex(full_key, CACHE_TTL, value)
+        if len(_local) >= _LOCAL_MAX:
+            _local.clear()
+        _local[full_key] = value
+    except redis.RedisError:
+        pass
+
+
+async def invalidate_products():
+    """Bump the version counter so every product key misses at once."""
+    _local.clear()
+    if _client is None:
+        return
+    try:
+        await _client.incr(_VERSION_KEY)
+    except redis.RedisError:
+        pass
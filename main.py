@@ -1,14 +1,21 @@
+import functools
+import json
 import os
-from datetime import datetime, date
+import re
+from datetime import datetime, date, timezone
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReplaceOne, ReturnDocument
 
+from cache import get_cached, set_cached, invalidate_products
 from database import db
-from schemas import Product as ProductSchema, User as UserSchema, Address as AddressSchema, Order as OrderSchema
+from schemas import Product as ProductSchema, Address as AddressSchema, Order as OrderSchema
 
 
 class PyObjectId(ObjectId):
@@ -20,11 +27,26 @@ class PyObjectId(ObjectId):
     def validate(cls, v):
         if isinstance(v, ObjectId):
             return v
-        if not ObjectId.is_valid(v):
+        # ObjectId(None) would generate a fresh id rather than fail
+        if v is None:
             raise ValueError("Invalid ObjectId")
-        return ObjectId(v)
+        # ObjectId() does the same parse as is_valid(); one try/except
+        # avoids parsing the string twice.
+        try:
+            return ObjectId(v)
+        except (InvalidId, TypeError):
+            raise ValueError("Invalid ObjectId")
+
+
+def parse_object_id(value: str) -> ObjectId:
+    """Reject malformed ids with a 400 before any Mongo round-trip."""
+    try:
+        return PyObjectId.validate(value)
+    except ValueError:
+        raise HTTPException(400, f"Invalid id: {value}")
 
 
+@functools.lru_cache(maxsize=1)
 def usd_to_syp_rate() -> int:
     try:
         return int(os.getenv("USD_TO_SYP", "15000"))
@@ -62,13 +84,29 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def ensure_indexes():
+    if db is None:
+        return
+    await db["product"].create_index([("name", "text"), ("description", "text")], name="product_text")
+    # Compound indexes matching the list_products filter (equality fields
+    # first) followed by each supported sort key, so filter + sort are both
+    # index-covered.
+    await db["product"].create_index([("category", 1), ("featured", 1), ("new_arrival", 1), ("price_syp", 1)])
+    await db["product"].create_index([("category", 1), ("featured", 1), ("new_arrival", 1), ("name", 1)])
+    await db["product"].create_index([("category", 1), ("featured", 1), ("new_arrival", 1), ("created_at", -1)])
+    await db["user"].create_index([("phone", 1)], unique=True)
+    await db["order"].create_index([("user_phone", 1), ("created_at", -1)])
+    await db["order"].create_index([("user_phone", 1), ("status", 1), ("updated_at", -1)])
+
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"name": "Handmade by Rama", "status": "ok"}
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     resp = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -76,7 +114,7 @@ def test_database():
         "rate": usd_to_syp_rate(),
     }
     try:
-        collections = db.list_collection_names()
+        collections = await db.list_collection_names()
         resp["database"] = "✅ Connected"
         resp["collections"] = collections
     except Exception as e:
@@ -88,6 +126,15 @@ def test_database():
 # Products
 # -----------------------------
 
+_SORT_MAP = {
+    "name_asc": ("name", 1),
+    "name_desc": ("name", -1),
+    "price_asc": ("price_syp", 1),
+    "price_desc": ("price_syp", -1),
+    "new": ("created_at", -1),
+}
+
+
 class ProductIn(BaseModel):
     name: str
     description: Optional[str] = None
@@ -101,13 +148,21 @@ class ProductIn(BaseModel):
 
 
 @app.get("/api/products")
-def list_products(
+async def list_products(
     category: Optional[str] = None,
     search: Optional[str] = None,
     featured: Optional[bool] = None,
     new_arrival: Optional[bool] = None,
-    sort: Optional[str] = Query(None, description="name_asc|name_desc|price_asc|price_desc|new")
+    sort: Optional[str] = Query(None, description="name_asc|name_desc|price_asc|price_desc|new"),
+    prefix: bool = Query(False, description="Match search as a name prefix instead of full-text"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200)
 ):
+    cache_key = f"products:{category}:{search}:{featured}:{new_arrival}:{sort}:{prefix}:{skip}:{limit}"
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
     q = {}
     if category:
         q["category"] = category
@@ -116,37 +171,80 @@ def list_products(
     if new_arrival is not None:
         q["new_arrival"] = new_arrival
 
-    cursor = db["product"].find(q)
-
+    text_search = False
     if search:
-        cursor = db["product"].find({**q, "name": {"$regex": search, "$options": "i"}})
-
-    sort_map = {
-        "name_asc": ("name", 1),
-        "name_desc": ("name", -1),
-        "price_asc": ("price_syp", 1),
-        "price_desc": ("price_syp", -1),
-        "new": ("created_at", -1),
+        if prefix or len(search) <= 3:
+            # Anchored, escaped prefix regex: walks only the matching range
+            # of the name index instead of a two-way wildcard scan. Very
+            # short terms also land here since stemmed text search is
+            # useless for them.
+            q["name"] = {"$regex": "^" + re.escape(search), "$options": "i"}
+        else:
+            q["$text"] = {"$search": search}
+            text_search = True
+
+    # One aggregation round-trip: $match first (index-backed), $sort on the
+    # same index, then $facet returns the requested page and the total
+    # match count together. The $project keeps list-view fields plus the
+    # first image only.
+    projection = {
+        "name": 1,
+        "category": 1,
+        "price_syp": 1,
+        "price_usd": 1,
+        "featured": 1,
+        "new_arrival": 1,
+        "in_stock": 1,
+        "images": {"$slice": ["$images", 1]},
     }
-    if sort and sort in sort_map:
-        field, direction = sort_map[sort]
-        cursor = cursor.sort(field, direction)
 
-    products = [product_doc_with_id(p) for p in cursor]
-    return {"items": products, "count": len(products)}
+    sort_key = _SORT_MAP.get(sort)
+    if sort_key:
+        sort_stage = {sort_key[0]: sort_key[1]}
+    elif text_search:
+        sort_stage = {"score": {"$meta": "textScore"}}
+    else:
+        sort_stage = None
+
+    pipeline = [{"$match": q}]
+    if sort_stage:
+        pipeline.append({"$sort": sort_stage})
+    pipeline.append({
+        "$facet": {
+            "items": [{"$skip": skip}, {"$limit": limit}, {"$project": projection}],
+            "total": [{"$count": "n"}],
+        }
+    })
+
+    facets = await db["product"].aggregate(pipeline).to_list(length=1)
+    facet = facets[0] if facets else {"items": [], "total": []}
+    products = [product_doc_with_id(p) for p in facet["items"]]
+    total = facet["total"][0]["n"] if facet["total"] else 0
+
+    result = {"items": products, "count": total, "skip": skip, "limit": limit}
+    await set_cached(cache_key, json.dumps(jsonable_encoder(result)))
+    return result
 
 
 @app.get("/api/products/{product_id}")
-def get_product(product_id: str):
-    doc = db["product"].find_one({"_id": ObjectId(product_id)})
+async def get_product(product_id: str):
+    cache_key = f"product:{product_id}"
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    doc = await db["product"].find_one({"_id": parse_object_id(product_id)})
     if not doc:
         raise HTTPException(404, "Product not found")
-    return product_doc_with_id(doc)
+
+    result = product_doc_with_id(doc)
+    await set_cached(cache_key, json.dumps(jsonable_encoder(result)))
+    return result
 
 
 @app.post("/api/seed")
-def seed_products(force: bool = False):
-    count = db["product"].count_documents({})
+async def seed_products(force: bool = False):
+    count = await db["product"].count_documents({})
     if count > 0 and not force:
         return {"status": "exists", "count": count}
 
@@ -204,17 +302,19 @@ def seed_products(force: bool = False):
         },
     ]
 
-    # Validate with ProductSchema and insert
+    # Validate with ProductSchema and upsert by name, so re-seeding is
+    # idempotent and happens in one batched write instead of wipe + insert
+    now = datetime.now(timezone.utc)
     docs = []
     for p in seed:
-        schema = ProductSchema(**p)
-        doc = schema.model_dump()
-        doc["created_at"] = datetime.utcnow()
-        doc["updated_at"] = datetime.utcnow()
+        doc = ProductSchema(**p).model_dump()
+        doc["created_at"] = now
+        doc["updated_at"] = now
         docs.append(doc)
 
-    db["product"].delete_many({})
-    db["product"].insert_many(docs)
+    ops = [ReplaceOne({"name": d["name"]}, d, upsert=True) for d in docs]
+    await db["product"].bulk_write(ops, ordered=False)
+    await invalidate_products()
 
     return {"status": "seeded", "count": len(docs)}
 
@@ -224,8 +324,8 @@ def seed_products(force: bool = False):
 # -----------------------------
 
 @app.get("/api/user/{phone}/addresses")
-def get_addresses(phone: str):
-    user = db["user"].find_one({"phone": phone})
+async def get_addresses(phone: str):
+    user = await db["user"].find_one({"phone": phone})
     if not user:
         return {"addresses": []}
     return {"addresses": user.get("addresses", [])}
@@ -236,21 +336,19 @@ class AddressIn(AddressSchema):
 
 
 @app.post("/api/user/{phone}/addresses")
-def add_address(phone: str, body: AddressIn):
-    user = db["user"].find_one({"phone": phone})
-    addr = body.model_dump()
-    if not user:
-        user_doc = UserSchema(phone=phone, name=body.full_name, addresses=[body]).model_dump()
-        user_doc["created_at"] = datetime.utcnow()
-        user_doc["updated_at"] = datetime.utcnow()
-        db["user"].insert_one(user_doc)
-        return {"ok": True}
-    # append if not duplicate (match by phone+street)
-    addresses = user.get("addresses", [])
-    exists = any((a.get("phone") == addr.get("phone") and a.get("street") == addr.get("street")) for a in addresses)
-    if not exists:
-        addresses.append(addr)
-        db["user"].update_one({"_id": user["_id"]}, {"$set": {"addresses": addresses, "updated_at": datetime.utcnow()}})
+async def add_address(phone: str, body: AddressIn):
+    # Single atomic upsert: creates the user on first contact and lets the
+    # server deduplicate the address, instead of a read-modify-write cycle.
+    now = datetime.now(timezone.utc)
+    await db["user"].update_one(
+        {"phone": phone},
+        {
+            "$setOnInsert": {"name": body.full_name, "created_at": now, "is_active": True},
+            "$addToSet": {"addresses": body.model_dump()},
+            "$set": {"updated_at": now},
+        },
+        upsert=True,
+    )
     return {"ok": True}
 
 
@@ -258,6 +356,8 @@ def add_address(phone: str, body: AddressIn):
 # Orders
 # -----------------------------
 
+ALLOWED_ORDER_STATUS = frozenset({"Pending", "Confirmed", "On Delivery", "Delivered", "Canceled", "Pending COD"})
+
 class OrderItemIn(BaseModel):
     product_id: str
     quantity: int = Field(..., ge=1)
@@ -274,11 +374,20 @@ class OrderCreateIn(BaseModel):
 
 
 @app.post("/api/orders")
-def create_order(body: OrderCreateIn):
-    # Load products and compute totals
+async def create_order(body: OrderCreateIn):
+    # Load all products in one round-trip and compute totals
+    oids = [parse_object_id(it.product_id) for it in body.items]
+    prods = {
+        p["_id"]: p
+        async for p in db["product"].find(
+            {"_id": {"$in": oids}},
+            projection={"name": 1, "category": 1, "price_syp": 1, "price_usd": 1, "images": {"$slice": 1}},
+        )
+    }
+
     items_out = []
-    for it in body.items:
-        prod = db["product"].find_one({"_id": ObjectId(it.product_id)})
+    for it, oid in zip(body.items, oids):
+        prod = prods.get(oid)
         if not prod:
             raise HTTPException(400, f"Invalid product: {it.product_id}")
         price_syp = int(prod.get("price_syp", 0))
@@ -290,10 +399,13 @@ def create_order(body: OrderCreateIn):
             "quantity": it.quantity,
             "price_syp": price_syp,
             "price_usd": price_usd,
+            # images arrives $slice'd to one element, so this walks a
+            # single-item list rather than the full URL array
             "image": (prod.get("images") or [None])[0]
         })
 
     addr = AddressSchema(full_name=body.full_name, phone=body.phone, city=body.city, street=body.street, notes=body.notes)
+    addr_dict = addr.model_dump()
 
     order_schema = OrderSchema(
         user_phone=addr.phone,
@@ -306,33 +418,37 @@ def create_order(body: OrderCreateIn):
     )
 
     order_doc = order_schema.model_dump()
-    now = datetime.utcnow()
+    now = datetime.now(timezone.utc)
     order_doc["created_at"] = now
     order_doc["updated_at"] = now
 
-    result = db["order"].insert_one(order_doc)
+    result = await db["order"].insert_one(order_doc)
 
-    # Upsert user & save address
-    user = db["user"].find_one({"phone": addr.phone})
-    if not user:
-        user_doc = UserSchema(phone=addr.phone, name=addr.full_name, addresses=[addr]).model_dump()
-        user_doc["created_at"] = now
-        user_doc["updated_at"] = now
-        db["user"].insert_one(user_doc)
-    else:
-        addresses = user.get("addresses", [])
-        exists = any((a.get("phone") == addr.phone and a.get("street") == addr.street) for a in addresses)
-        if not exists:
-            addresses.append(addr.model_dump())
-            db["user"].update_one({"_id": user["_id"]}, {"$set": {"addresses": addresses, "updated_at": now}})
+    # Upsert user & save address in one atomic round-trip
+    await db["user"].update_one(
+        {"phone": addr.phone},
+        {
+            "$setOnInsert": {"name": addr.full_name, "created_at": now, "is_active": True},
+            "$addToSet": {"addresses": addr_dict},
+            "$set": {"updated_at": now},
+        },
+        upsert=True,
+    )
 
     return {"id": str(result.inserted_id), "status": "Pending COD"}
 
 
 @app.get("/api/orders")
-def get_orders(phone: str):
-    cursor = db["order"].find({"user_phone": phone}).sort("created_at", -1)
-    orders = [order_doc_with_id(o) for o in cursor]
+async def get_orders(phone: str):
+    projection = {
+        "status": 1,
+        "created_at": 1,
+        "items.name": 1,
+        "items.quantity": 1,
+        "items.price_syp": 1,
+    }
+    cursor = db["order"].find({"user_phone": phone}, projection).sort("created_at", -1)
+    orders = [order_doc_with_id(o) async for o in cursor]
     return {"items": orders}
 
 
@@ -343,32 +459,40 @@ class StatusUpdateIn(BaseModel):
 
 
 @app.patch("/api/orders/{order_id}/status")
-def update_order_status(order_id: str, body: StatusUpdateIn):
-    allowed = {"Pending", "Confirmed", "On Delivery", "Delivered", "Canceled", "Pending COD"}
-    if body.status not in allowed:
+async def update_order_status(order_id: str, body: StatusUpdateIn):
+    if body.status not in ALLOWED_ORDER_STATUS:
         raise HTTPException(400, "Invalid status")
 
     upd = {
         "status": body.status,
-        "updated_at": datetime.utcnow(),
+        "updated_at": datetime.now(timezone.utc),
     }
     if body.admin_note is not None:
         upd["admin_note"] = body.admin_note
     if body.expected_delivery_date is not None:
         upd["expected_delivery_date"] = body.expected_delivery_date
 
-    res = db["order"].update_one({"_id": ObjectId(order_id)}, {"$set": upd})
-    if res.matched_count == 0:
+    doc = await db["order"].find_one_and_update(
+        {"_id": parse_object_id(order_id)},
+        {"$set": upd},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
         raise HTTPException(404, "Order not found")
-
-    doc = db["order"].find_one({"_id": ObjectId(order_id)})
     return order_doc_with_id(doc)
 
 
 @app.get("/api/orders/notifications")
-def order_notifications(phone: str):
+async def order_notifications(phone: str):
     """For customer homepage banner: if any order is On Delivery, return message and expected date."""
-    doc = db["order"].find_one({"user_phone": phone, "status": "On Delivery"}, sort=[("updated_at", -1)])
+    # hint pins the query to the compound index declared at startup so the
+    # planner can't regress onto another candidate as indexes are added.
+    doc = await db["order"].find_one(
+        {"user_phone": phone, "status": "On Delivery"},
+        projection={"expected_delivery_date": 1},
+        sort=[("updated_at", -1)],
+        hint=[("user_phone", 1), ("status", 1), ("updated_at", -1)],
+    )
     if not doc:
         return {"on_delivery": False}
     return {
@@ -10,6 +10,8 @@ Collection name is the lowercase of the class name.
 - Address -> embedded in User but may also be stored separately if needed
 """
 
+import re
+
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Literal
 from datetime import date
@@ -20,6 +22,10 @@ from datetime import date
 
 CategoryLiteral = Literal["necklaces", "bracelets", "earrings", "rings"]
 
+# Accepts +963XXXXXXXX(X) or 09XXXXXXXX; compiled once since phone
+# validation runs on every Address creation.
+_PHONE_RE = re.compile(r"^(?:\+963(\d{8,9})|09(\d{8}))$")
+
 
 class Address(BaseModel):
     id: Optional[str] = Field(None, description="Address identifier")
@@ -30,16 +36,13 @@ class Address(BaseModel):
     notes: Optional[str] = Field(None, description="Optional delivery notes")
 
     @field_validator("phone")
-    @classmethod
-    def validate_phone(cls, v: str) -> str:
-        # Accept +963XXXXXXXXX or 09XXXXXXXX with normalization to +963
-        v = v.strip()
-        if v.startswith("+963") and len(v) in (12, 13):
-            return v
-        if v.startswith("09") and len(v) == 10:
-            # Normalize 09XXXXXXXX -> +9639XXXXXXXX
-            return "+963" + v[1:]
-        raise ValueError("Phone must be in Syrian format starting with +963 or 09")
+    @staticmethod
+    def validate_phone(v: str) -> str:
+        # Normalize to +963 in one regex pass
+        m = _PHONE_RE.match(v.strip())
+        if not m:
+            raise ValueError("Phone must be in Syrian format starting with +963 or 09")
+        return "+963" + (m.group(1) or "9" + m.group(2))
 
 
 class User(BaseModel):